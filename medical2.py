@@ -1,142 +1,378 @@
 import spacy
+from spacy.matcher import PhraseMatcher
 import streamlit as st
-from langchain_community.llms import Ollama
 from langchain_ollama import OllamaLLM
 from langchain.prompts import PromptTemplate
+import httpx
+import pymupdf
 import PyPDF2
 import io
+import re
 import sqlite3
+import threading
 import hashlib
+import hmac
+import zstandard
 from datetime import datetime
+from bisect import bisect_right
 import os
 
-# Load the standard English model
-nlp = spacy.load("en_core_web_lg")
+# Streamlit re-executes this script on every rerun, so anything that should be
+# built once per process lives in an st.cache_resource function.
+# Load the small English model once and share it across sessions. Word vectors
+# are never queried, so the large model only costs memory. Only NER and the
+# tagger/parser (which noun_chunks relies on, via the attribute_ruler's POS
+# mapping) are used, so the lemmatizer and the (disabled by default) senter are
+# not loaded at all.
+@st.cache_resource
+def get_nlp():
+    return spacy.load("en_core_web_sm", exclude=["lemmatizer", "senter"])
 
-# Initialize Ollama
-llm = OllamaLLM(model="llama2")
+# Words that mark a noun chunk as a likely symptom or condition
+MEDICAL_WORDS = frozenset({'pain', 'ache', 'discomfort', 'swelling', 'fever',
+                           'infection', 'inflammation', 'disease', 'syndrome',
+                           'condition', 'symptom', 'treatment'})
 
-# Database initialization
+# The parser is super-linear on long documents, so spaCy sees at most
+# MAX_ANALYSIS_CHARS in total, split into windows of at most MAX_WINDOW_CHARS
+MAX_ANALYSIS_CHARS = 200_000
+MAX_WINDOW_CHARS = 10_000
+
+# Texts are also split into paragraphs so nlp.pipe can batch even a single input
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+# Medical-related entity labels. The standard model only emits generic labels,
+# but a medical model can be dropped in and its entities will be picked up.
+MEDICAL_LABELS = frozenset({'DISEASE', 'CONDITION', 'SYMPTOM', 'TREATMENT',
+                            'CHEMICAL', 'MEDICINE', 'BODY_PART'})
+
+# Generic labels whose entities count when they contain an acronym: two or more
+# capitals and digits with at least one capital ("WHO", "H1N1", "3M"), or dotted
+# capitals ("U.S."). Unlike str.isupper(), a lone capital ("A") is not an
+# acronym, and only Latin-1, Greek and Cyrillic capitals are recognized.
+ACRONYM_CAPITALS = "A-ZÀ-ÖØ-ÞΑ-ΩЁА-Я"
+ACRONYM_LABELS = frozenset({'ORG', 'GPE'})
+HAS_ACRONYM = re.compile(
+    rf"\b(?:[0-9]*[{ACRONYM_CAPITALS}][{ACRONYM_CAPITALS}0-9]+|[0-9]+[{ACRONYM_CAPITALS}])\b"
+    rf"|\b[{ACRONYM_CAPITALS}](?:\.[{ACRONYM_CAPITALS}])+"
+).search
+
+# Match the medical words case-insensitively in a single pass over the doc
+@st.cache_resource
+def get_medical_word_matcher():
+    nlp = get_nlp()
+    matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+    matcher.add("MEDICAL_WORD", list(nlp.tokenizer.pipe(sorted(MEDICAL_WORDS))))
+    return matcher
+
+# Single-pass scanner for the fast keyword path, which skips the spaCy
+# pipeline entirely: short capitalized phrases stand in for named entities and
+# the medical words (matched case-insensitively) for the noun-chunk scan
+FAST_KEYWORD_PATTERN = re.compile(
+    r"\b(?:[A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,2}"
+    r"|(?i:" + "|".join(sorted(MEDICAL_WORDS)) + r"))\b"
+)
+
+OLLAMA_MODEL = "llama2"
+
+# Keep connections to the Ollama server alive between requests. Ollama serves
+# plain HTTP/1.1, so reusing pooled connections is what saves the setup cost.
+OLLAMA_CLIENT_KWARGS = {
+    "limits": httpx.Limits(max_keepalive_connections=40, keepalive_expiry=30.0),
+}
+
+# Initialize Ollama once per process
+@st.cache_resource
+def get_llm():
+    return OllamaLLM(model=OLLAMA_MODEL, client_kwargs=OLLAMA_CLIENT_KWARGS)
+
+# Shared database connection in WAL mode, and the lock serializing its use across sessions
+@st.cache_resource
+def get_db_lock():
+    return threading.Lock()
+
+@st.cache_resource
+def get_db():
+    conn = sqlite3.connect('medical_app.db', check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Rows support access by column name, without per-row tuple unpacking
+    conn.row_factory = sqlite3.Row
+    return conn
+
+# Recommendations are multi-KB LLM responses, so they are stored zstd-compressed
+zstd_compressor = zstandard.ZstdCompressor(level=3)
+zstd_decompressor = zstandard.ZstdDecompressor()
+
+def compress_text(text):
+    return zstd_compressor.compress(text.encode())
+
+def decompress_text(data):
+    # Rows written before compression was introduced hold plain text
+    if isinstance(data, str):
+        return data
+    return zstd_decompressor.decompress(data).decode()
+
+# Database initialization, run once per process
+@st.cache_resource
 def init_db():
-    conn = sqlite3.connect('medical_app.db')
-    c = conn.cursor()
-    
-    # Create users table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-    ''')
-    
-    # Create history table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS analysis_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            analysis_date DATETIME,
-            medical_terms TEXT,
-            summary TEXT,
-            recommendations TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    conn = get_db()
+    with get_db_lock():
+        # Create users table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL
+            )
+        ''')
+        
+        # Create history table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                analysis_date DATETIME,
+                medical_terms TEXT,
+                summary TEXT,
+                recommendations TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        
+        # Index history by user and date so get_user_history is a range scan
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_history_user_date
+            ON analysis_history (user_id, analysis_date DESC)
+        ''')
+        
+        # Create recommendations cache table, keyed on recommendations_cache_key()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS recommendations_cache (
+                summary_hash TEXT PRIMARY KEY,
+                response TEXT NOT NULL
+            )
+        ''')
+
+# Password hashing parameters, stored with each hash as "scrypt$n$r$p$salt$hash"
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+# Hash password with scrypt and a random per-user salt
+def hash_password(password, salt=None, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    if salt is None:
+        salt = os.urandom(16)
+    key = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32)
+    return f"scrypt${n}${r}${p}${salt.hex()}${key.hex()}"
+
+def check_password(stored, password):
+    if stored.startswith("scrypt$"):
+        _, n, r, p, salt, _ = stored.split("$")
+        candidate = hash_password(password, bytes.fromhex(salt), int(n), int(r), int(p))
+    else:
+        # Accounts created before scrypt hashing store a single SHA-256 digest
+        candidate = hashlib.sha256(password.encode()).hexdigest()
+    # Constant-time comparison, so response timing does not leak the hash
+    return hmac.compare_digest(candidate, stored)
 
-# Hash password
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+def needs_rehash(stored):
+    return not stored.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+# Queries run on the shared connection. Keeping each as one constant means
+# every call reuses the connection's cached prepared statement.
+SQL_INSERT_USER = "INSERT INTO users (username, password) VALUES (?, ?)"
+SQL_SELECT_USER = "SELECT id, password FROM users WHERE username = ?"
+SQL_UPDATE_PASSWORD = "UPDATE users SET password = ? WHERE id = ?"
+
+SQL_INSERT_HISTORY = """
+    INSERT INTO analysis_history 
+    (user_id, analysis_date, medical_terms, summary, recommendations)
+    VALUES (?, ?, ?, ?, ?)
+"""
+SQL_SELECT_HISTORY_PAGE = """
+    SELECT id, analysis_date 
+    FROM analysis_history 
+    WHERE user_id = ?
+    ORDER BY analysis_date DESC
+    LIMIT ? OFFSET ?
+"""
+SQL_SELECT_ANALYSIS_RECOMMENDATIONS = """
+    SELECT recommendations 
+    FROM analysis_history 
+    WHERE id = ? AND user_id = ?
+"""
+
+SQL_SELECT_CACHED_RECOMMENDATIONS = \
+    "SELECT response FROM recommendations_cache WHERE summary_hash = ?"
+SQL_UPSERT_CACHED_RECOMMENDATIONS = \
+    "INSERT OR REPLACE INTO recommendations_cache (summary_hash, response) VALUES (?, ?)"
 
 # User authentication functions
 def create_user(username, password):
-    conn = sqlite3.connect('medical_app.db')
-    c = conn.cursor()
+    conn = get_db()
+    # Hash outside the lock: scrypt is deliberately slow and the lock is shared
+    password_hash = hash_password(password)
     try:
-        c.execute("INSERT INTO users (username, password) VALUES (?, ?)",
-                 (username, hash_password(password)))
-        conn.commit()
+        with get_db_lock():
+            conn.execute(SQL_INSERT_USER, (username, password_hash))
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
 def verify_user(username, password):
-    conn = sqlite3.connect('medical_app.db')
-    c = conn.cursor()
-    c.execute("SELECT id, password FROM users WHERE username = ?", (username,))
-    result = c.fetchone()
-    conn.close()
-    if result and result[1] == hash_password(password):
-        return result[0]  # Return user_id
+    conn = get_db()
+    with get_db_lock():
+        result = conn.execute(SQL_SELECT_USER, (username,)).fetchone()
+    if result and check_password(result["password"], password):
+        # Upgrade legacy or outdated hashes while the password is at hand
+        if needs_rehash(result["password"]):
+            new_hash = hash_password(password)
+            with get_db_lock():
+                conn.execute(SQL_UPDATE_PASSWORD, (new_hash, result["id"]))
+        return result["id"]
     return None
 
 def save_analysis(user_id, medical_terms, summary, recommendations):
-    conn = sqlite3.connect('medical_app.db')
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO analysis_history 
-        (user_id, analysis_date, medical_terms, summary, recommendations)
-        VALUES (?, ?, ?, ?, ?)
-    """, (user_id, datetime.now(), medical_terms, summary, recommendations))
-    conn.commit()
-    conn.close()
-
-def get_user_history(user_id):
-    conn = sqlite3.connect('medical_app.db')
-    c = conn.cursor()
-    c.execute("""
-        SELECT analysis_date, medical_terms, summary, recommendations 
-        FROM analysis_history 
-        WHERE user_id = ?
-        ORDER BY analysis_date DESC
-    """, (user_id,))
-    history = c.fetchall()
-    conn.close()
-    return history
+    conn = get_db()
+    with get_db_lock():
+        conn.execute(SQL_INSERT_HISTORY,
+                    (user_id, datetime.now(), medical_terms, summary,
+                     compress_text(recommendations)))
+
+# Number of analyses listed per page of the History view
+HISTORY_PAGE_SIZE = 20
+
+def get_user_history(user_id, offset=0, limit=HISTORY_PAGE_SIZE):
+    """Return one page of rows with id and analysis_date, newest first."""
+    conn = get_db()
+    with get_db_lock():
+        return conn.execute(SQL_SELECT_HISTORY_PAGE, (user_id, limit, offset)).fetchall()
+
+def get_analysis_recommendations(user_id, analysis_id):
+    """Return one analysis's recommendations, or None if the user has no such analysis."""
+    conn = get_db()
+    with get_db_lock():
+        row = conn.execute(SQL_SELECT_ANALYSIS_RECOMMENDATIONS, (analysis_id, user_id)).fetchone()
+        return decompress_text(row["recommendations"]) if row else None
+
+# Recommendation cache functions. The key covers the model and the exact prompt
+# sent to it, so changing either stops older answers from being served.
+def recommendations_cache_key(model, prompt):
+    key = hashlib.sha256()
+    for part in (model, prompt):
+        key.update(part.encode())
+        key.update(b"\0")
+    return key.hexdigest()
+
+def get_cached_recommendations(cache_key):
+    conn = get_db()
+    with get_db_lock():
+        result = conn.execute(SQL_SELECT_CACHED_RECOMMENDATIONS, (cache_key,)).fetchone()
+        return decompress_text(result["response"]) if result else None
+
+def cache_recommendations(cache_key, response):
+    conn = get_db()
+    with get_db_lock():
+        conn.execute(SQL_UPSERT_CACHED_RECOMMENDATIONS, (cache_key, compress_text(response)))
 
 # Previous functions remain the same
-def extract_text_from_pdf(pdf_file):
-    """Extract text from uploaded PDF file."""
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
-
-def extract_medical_keywords(text):
-    """Extract medical entities from text using spaCy."""
-    doc = nlp(text)
-    
-    # Define medical-related labels that are available in the standard model
-    medical_labels = {'DISEASE', 'CONDITION', 'SYMPTOM', 'TREATMENT', 
-                     'CHEMICAL', 'MEDICINE', 'BODY_PART'}
+def iter_pdf_pages(pdf_bytes):
+    """Yield the text of each page of an uploaded PDF file's contents.
     
-    # Extract entities that might be medical-related
-    medical_entities = []
-    
-    # Use standard entities
-    for ent in doc.ents:
-        # Include specific entity types and any capitalized terms that might be medical
-        if (ent.label_ in ['ORG', 'GPE'] and any(word.isupper() for word in ent.text.split())) or \
-           ent.label_ == 'CONDITION' or \
-           (len(ent.text.split()) <= 3 and ent.text[0].isupper()):
-            medical_entities.append(ent.text)
+    Uses MuPDF, falling back to PyPDF2 for files MuPDF cannot open.
+    """
+    try:
+        doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+    except pymupdf.FileDataError:
+        for page in PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages:
+            yield page.extract_text()
+        return
+    with doc:
+        for page in doc:
+            yield page.get_text()
+
+# Cached on the file contents, so the same upload is only parsed once
+@st.cache_data(show_spinner=False, max_entries=32)
+def extract_text_from_pdf(pdf_bytes):
+    """Extract text from uploaded PDF file contents, one string per page."""
+    return list(iter_pdf_pages(pdf_bytes))
+
+def iter_text_windows(texts, max_chars=MAX_ANALYSIS_CHARS, window_chars=MAX_WINDOW_CHARS):
+    """Split texts into paragraphs for spaCy, breaking long ones at line or word boundaries."""
+    remaining = max_chars
+    for text in texts:
+        text = text[:remaining]
+        remaining -= len(text)
+        for paragraph in PARAGRAPH_BREAK.split(text):
+            while len(paragraph) > window_chars:
+                cut = paragraph.rfind("\n", 0, window_chars)
+                if cut <= 0:
+                    cut = paragraph.rfind(" ", 0, window_chars)
+                if cut <= 0:
+                    cut = window_chars
+                yield paragraph[:cut]
+                paragraph = paragraph[cut:]
+            if paragraph.strip():
+                yield paragraph
+        if remaining <= 0:
+            return
+
+def unique_ignoring_case(terms):
+    """Yield terms in order, skipping repeats that differ only in case."""
+    seen = set()
+    for term in terms:
+        key = term.lower()
+        if key not in seen:
+            seen.add(key)
+            yield term
+
+def iter_medical_entities(texts):
+    """Yield medical entity candidates from an iterable of texts using spaCy.
     
-    # Add noun chunks that might be symptoms or conditions
-    for chunk in doc.noun_chunks:
-        # Look for medical-related words in the chunk
-        if any(token.text.lower() in ['pain', 'ache', 'discomfort', 'swelling', 'fever', 
-                                    'infection', 'inflammation', 'disease', 'syndrome', 
-                                    'condition', 'symptom', 'treatment']
-               for token in chunk):
-            medical_entities.append(chunk.text)
+    Texts are consumed lazily and only the entity strings are kept, so at most
+    one batch of Docs is in memory at a time.
+    """
+    nlp = get_nlp()
+    matcher = get_medical_word_matcher()
     
-    # Remove duplicates while preserving order
-    return list(dict.fromkeys(medical_entities))
+    # Process the texts in batches rather than as one concatenated document.
+    # Everything runs in-process (n_process=1): worker processes would each
+    # have to fork the Streamlit server and reload the model per request.
+    for doc in nlp.pipe(iter_text_windows(texts), batch_size=8):
+        # Use standard entities
+        for ent in doc.ents:
+            # Include specific entity types and any capitalized terms that might be medical
+            if (ent.label_ in ACRONYM_LABELS and HAS_ACRONYM(ent.text)) or \
+               ent.label_ in MEDICAL_LABELS or \
+               (len(ent.text.split()) <= 3 and ent.text[0].isupper()):
+                yield ent.text
+        
+        # Add noun chunks that might be symptoms or conditions, i.e. the
+        # chunks enclosing a matched medical-related word
+        chunks = list(doc.noun_chunks)
+        chunk_starts = [chunk.start for chunk in chunks]
+        for _, start, _ in matcher(doc):
+            i = bisect_right(chunk_starts, start) - 1
+            if i >= 0 and start < chunks[i].end:
+                yield chunks[i].text
+
+# Cached on the texts' content, so re-analyzing the same report skips spaCy
+@st.cache_data(show_spinner=False, max_entries=128)
+def extract_medical_keywords(texts):
+    """Extract medical entities from a list of texts (e.g. PDF pages) using spaCy."""
+    # Remove duplicates (ignoring case) while preserving order, as they are found
+    return list(unique_ignoring_case(iter_medical_entities(texts)))
+
+def extract_medical_keywords_fast(texts):
+    """Extract likely medical terms from a list of texts using regular expressions only."""
+    # Remove duplicates (ignoring case) while preserving order, as they are found
+    return list(unique_ignoring_case(
+        match.group()
+        for text in texts
+        for match in FAST_KEYWORD_PATTERN.finditer(text)
+    ))
 
 def generate_summary(keywords):
     """Generate a summary paragraph from extracted keywords."""
@@ -144,9 +380,10 @@ def generate_summary(keywords):
         return "No specific medical terms were identified in the input."
     return f"Based on the analysis, the key medical conditions and symptoms include: {', '.join(keywords)}."
 
-def generate_recommendations(summary):
-    """Generate medical and lifestyle recommendations using Ollama."""
-    prompt_template = """
+# Recommendations prompt, built once rather than on every request
+RECOMMENDATIONS_PROMPT = PromptTemplate(
+    input_variables=["summary"],
+    template="""
     Based on the following medical summary, provide detailed recommendations in these categories:
 
     1. Specific Medications:
@@ -175,14 +412,29 @@ def generate_recommendations(summary):
     
     Response:
     """
+)
+
+def generate_recommendations(summary):
+    """Stream medical and lifestyle recommendations from Ollama, chunk by chunk.
     
-    prompt = PromptTemplate(
-        input_variables=["summary"],
-        template=prompt_template
-    )
+    Summaries that were answered before are served from the cache instead.
+    """
+    llm = get_llm()
+    prompt = RECOMMENDATIONS_PROMPT.format(summary=summary)
+    cache_key = recommendations_cache_key(llm.model, prompt)
+    cached = get_cached_recommendations(cache_key)
+    if cached:
+        yield cached
+        return
     
-    response = llm(prompt.format(summary=summary))
-    return response
+    chunks = []
+    for chunk in llm.stream(prompt):
+        chunks.append(chunk)
+        yield chunk
+    # Don't replay an empty generation for every later request
+    response = "".join(chunks)
+    if response.strip():
+        cache_recommendations(cache_key, response)
 
 
 def login_page():
@@ -243,6 +495,8 @@ def main():
     # Logout button
     if st.sidebar.button("Logout"):
         st.session_state.user_id = None
+        st.session_state.history_page = 0
+        st.session_state.pop('open_analysis_id', None)
         st.rerun()
     
     if nav_option == "New Analysis":
@@ -253,29 +507,48 @@ def main():
             ("Type Text", "Upload File")
         )
         
+        pdf_pages = []
         if input_option == "Type Text":
             user_input = st.text_area("Enter your medical concerns or report:", height=200)
         else:
             uploaded_file = st.file_uploader("Upload medical report (PDF format)", type=['pdf'])
             if uploaded_file:
                 try:
-                    user_input = extract_text_from_pdf(uploaded_file)
+                    pdf_pages = extract_text_from_pdf(uploaded_file.getvalue())
+                    extracted_text = "\n".join(pdf_pages)
                     st.subheader("Extracted Text from PDF")
                     user_input = st.text_area("You can edit the extracted text if needed:", 
-                                            value=user_input, 
+                                            value=extracted_text, 
                                             height=200)
+                    # Analyze page by page unless the text was edited
+                    if user_input != extracted_text:
+                        pdf_pages = []
                 except Exception as e:
                     st.error(f"Error processing PDF: {str(e)}")
                     user_input = ""
             else:
                 user_input = ""
         
+        deep_analysis = st.checkbox("Deep analysis (slower, uses spaCy NLP)")
+        
         if st.button("Analyze") and user_input:
             with st.spinner("Analyzing..."):
                 try:
-                    keywords = extract_medical_keywords(user_input)
+                    texts = pdf_pages or [user_input]
+                    if deep_analysis:
+                        if sum(len(text) for text in texts) > MAX_ANALYSIS_CHARS:
+                            st.warning(f"Deep analysis only reads the first {MAX_ANALYSIS_CHARS:,} "
+                                       "characters of the input; terms after that are not extracted.")
+                        keywords = extract_medical_keywords(texts)
+                    else:
+                        keywords = extract_medical_keywords_fast(texts)
                     summary = generate_summary(keywords)
-                    recommendations = generate_recommendations(summary)
+                    
+                    # Display results, rendering recommendations as they are generated
+                    st.header("Analysis Results")
+
+                    st.subheader("Detailed Recommendations")
+                    recommendations = st.write_stream(generate_recommendations(summary))
                     
                     # Save analysis to history
                     save_analysis(
@@ -285,12 +558,6 @@ def main():
                         recommendations
                     )
                     
-                    # Display results
-                    st.header("Analysis Results")
-
-                    st.subheader("Detailed Recommendations")
-                    st.markdown(recommendations)
-                    
                     st.warning("""
                     IMPORTANT MEDICAL DISCLAIMER: This analysis is for informational purposes only 
                     and should not be considered medical advice. The medication suggestions are 
@@ -305,16 +572,45 @@ def main():
     
     else:  # History page
         st.header("Analysis History")
-        history = get_user_history(st.session_state.user_id)
+        if 'history_page' not in st.session_state:
+            st.session_state.history_page = 0
+        page = st.session_state.history_page
+        
+        # Fetch one extra row to tell whether there is a next page
+        history = get_user_history(st.session_state.user_id,
+                                   offset=page * HISTORY_PAGE_SIZE,
+                                   limit=HISTORY_PAGE_SIZE + 1)
+        has_next_page = len(history) > HISTORY_PAGE_SIZE
+        history = history[:HISTORY_PAGE_SIZE]
         
-        if not history:
+        if not history and page == 0:
             st.info("No analysis history found")
         else:
-            for i, (date, terms, summary, recommendations) in enumerate(history):
-                with st.expander(f"Analysis from {date}"):
-                    
-                    st.subheader("Recommendations")
-                    st.markdown(recommendations)
+            # Only the analysis the user opened has its details fetched and sent
+            open_analysis_id = st.session_state.get('open_analysis_id')
+            for analysis in history:
+                is_open = analysis["id"] == open_analysis_id
+                with st.expander(f"Analysis from {analysis['analysis_date']}", expanded=is_open):
+                    if is_open:
+                        recommendations = get_analysis_recommendations(
+                            st.session_state.user_id, analysis["id"])
+                        
+                        if recommendations is None:
+                            st.error("This analysis could not be found")
+                        else:
+                            st.subheader("Recommendations")
+                            st.markdown(recommendations)
+                    elif st.button("Load details", key=f"open_analysis_{analysis['id']}"):
+                        st.session_state.open_analysis_id = analysis["id"]
+                        st.rerun()
+            
+            prev_col, next_col = st.columns(2)
+            if page > 0 and prev_col.button("Previous page"):
+                st.session_state.history_page -= 1
+                st.rerun()
+            if has_next_page and next_col.button("Next page"):
+                st.session_state.history_page += 1
+                st.rerun()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file